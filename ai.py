@@ -1,11 +1,17 @@
-import json
+import asyncio
+import itertools
 import hashlib
+import re
 import time
 import math
 import random
-import requests
-from flask import Flask, request, jsonify
-from flask_cors import CORS
+import httpx
+import orjson
+import uvicorn
+from collections import Counter, defaultdict
+from functools import lru_cache
+from quart import Quart, request
+from quart_cors import cors
 
 # --- CONFIGURATION ---
 OLLAMA_URL = 'http://localhost:11434/api/generate'
@@ -19,53 +25,132 @@ OLLAMA_MODELS = [
 # Ensure Ollama is running and accessible before starting the server.
 # --- END CONFIGURATION ---
 
-app = Flask(__name__)
+app = Quart(__name__)
 # Enable CORS for the client running on a different port/origin (e.g., the browser file:// or a different local host).
-CORS(app) 
-ollama_model_index = 0
+app = cors(app)
+
+# Reuse one async HTTP/2 client for all Ollama calls: concurrent agents run
+# as coroutines (no thread-switch overhead) multiplexed over a single
+# connection instead of opening a socket per request.
+CLIENT = httpx.AsyncClient(
+    http2=True,
+    timeout=httpx.Timeout(300.0, connect=10.0),
+    limits=httpx.Limits(max_keepalive_connections=40, max_connections=100, keepalive_expiry=30.0)
+)
 
 # --- UTILITY FUNCTIONS (Server-Side Implementation) ---
 
-def sha256(data):
-    """Calculates the SHA-256 hash of a string."""
+def sha256_raw(data):
+    """Calculates the SHA-256 digest, returned as raw bytes.
+
+    The origin chain stays in raw 32-byte digests internally (half the
+    bytes of the hex form, and what OpenSSL's SHA-NI path wants to see);
+    callers hex-encode only at the JSON/display boundary.
+    """
     if isinstance(data, str):
         data = data.encode('utf-8')
-    return hashlib.sha256(data).hexdigest()
+    return hashlib.sha256(data).digest()
+
+# The origin chain is a non-adversarial nonce feeding entropy scoring, so it
+# doesn't need SHA-256's collision guarantees. BLAKE3 is SIMD-parallel and
+# several times faster; the public genesis hash stays on SHA-256 so the
+# client-facing format is unchanged. Falls back to SHA-256 when blake3 is
+# not installed.
+try:
+    from blake3 import blake3 as _blake3
+
+    def fast_hash_raw(data):
+        """Raw digest for the internal origin chain."""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        return _blake3(data).digest()
+except ImportError:
+    fast_hash_raw = sha256_raw
+
+# Precomputed c * log2(c) for every count a 64-char hash digest can produce,
+# so the entropy loop avoids per-character divisions and log calls.
+_LOG_TABLE = [0.0] + [c * math.log2(c) for c in range(1, 65)]
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Optional Numba-JIT kernel: counts bytes into a stack-allocated table in
+# native code. Falls back to the pure-Python Counter path when numba/numpy
+# are not installed.
+_entropy_u8 = None
+if np is not None:
+    try:
+        from numba import njit
+
+        @njit(cache=True, fastmath=True)
+        def _entropy_u8(buf):
+            counts = np.zeros(256, np.int64)
+            for b in buf:
+                counts[b] += 1
+            n = buf.size
+            entropy = 0.0
+            for c in counts:
+                if c:
+                    p = c / n
+                    entropy -= p * math.log2(p)
+            return entropy
+
+        # Warm the JIT at import so the first orchestration doesn't pay compile time.
+        _entropy_u8(np.frombuffer(b'0' * 64, np.uint8))
+    except ImportError:
+        pass
 
 def calculate_entropy(hash_string):
     """Calculates the Shannon entropy of a hash string."""
-    char_counts = {}
-    for char in hash_string:
-        char_counts[char] = char_counts.get(char, 0) + 1
-    
-    entropy = 0
     length = len(hash_string)
-    for count in char_counts.values():
-        probability = count / length
-        entropy -= probability * math.log2(probability)
-    return round(entropy, 3)
-
-def get_next_model():
-    """Cycles through the defined Ollama models."""
-    global ollama_model_index
-    model = OLLAMA_MODELS[ollama_model_index % len(OLLAMA_MODELS)]
-    ollama_model_index += 1
-    return model
+    if not length:
+        return 0
+    if isinstance(hash_string, str):
+        hash_string = hash_string.encode('utf-8')
+    if _entropy_u8 is not None:
+        buf = np.frombuffer(hash_string, np.uint8)
+        return round(_entropy_u8(buf), 3)
+    # Shannon entropy rewritten as log2(n) - sum(c*log2(c))/n over the counts.
+    total = sum(
+        _LOG_TABLE[count] if count < len(_LOG_TABLE) else count * math.log2(count)
+        for count in Counter(hash_string).values()
+    )
+    return round(math.log2(length) - total / length, 3)
+
+def entropy_batch(digests):
+    """Calculates Shannon entropy for a whole round of origin digests.
+
+    With NumPy available this is a single vectorized pass: one byte
+    histogram per digest via a strided bincount, then the entropy sum over
+    the probability matrix, instead of a Python-level call per agent.
+    """
+    if np is None or not digests:
+        return [calculate_entropy(d) for d in digests]
+    buf = np.frombuffer(b''.join(digests), np.uint8).reshape(len(digests), -1)
+    offsets = np.arange(len(digests), dtype=np.int64)[:, None] * 256
+    counts = np.bincount(
+        (buf.astype(np.int64) + offsets).ravel(),
+        minlength=len(digests) * 256
+    ).reshape(len(digests), 256)
+    p = counts / buf.shape[1]
+    terms = np.where(counts > 0, p * np.log2(np.where(counts > 0, p, 1.0)), 0.0)
+    return [round(float(e), 3) for e in -terms.sum(axis=1)]
 
 # --- AGENT AND ORCHESTRATION LOGIC ---
 
-def perform_fractal_reasoning(agent_id, model, prompt, context, round_num, origin, file_type, reasoning_depth):
+def build_shared_prompt(prompt, context, file_type, reasoning_depth):
     """
-    Sends the request to the Ollama API for a specific agent.
-    
-    Returns:
-        A dictionary containing the generated code candidate and the model used.
+    Builds the prompt block that is identical for every agent and round.
+
+    Keeping this prefix byte-identical across calls lets Ollama reuse its
+    server-side prompt cache for the shared tokens; only the short
+    agent/round tail below varies per call.
     """
     strategy = f"Apply recursive reasoning (depth {reasoning_depth}) and fractal code structure."
-    
-    full_prompt = (
-        f"You are an expert coding agent (Agent ID: {agent_id}, Model: {model}).\n"
-        f"You are in round {round_num + 1} of a multi-agent consensus.\n"
+    return (
+        f"You are an expert coding agent in a multi-agent consensus.\n"
         f"Your assigned strategy is: \"{strategy}\".\n"
         f"Analyze the user's request and the provided code to generate an improved or new code snippet.\n\n"
         f"USER REQUEST: \"{prompt}\"\n\n"
@@ -73,33 +158,93 @@ def perform_fractal_reasoning(agent_id, model, prompt, context, round_num, origi
         f"```\n{context}\n```\n\n"
         f"Provide ONLY the generated code snippet as your response. Do not include explanations, apologies, or markdown formatting."
     )
-    
+
+async def perform_fractal_reasoning(agent_id, model, shared_prompt, round_num, origin):
+    """
+    Sends the request to the Ollama API for a specific agent.
+
+    Returns:
+        A dictionary containing the generated code candidate and the model used.
+    """
+    full_prompt = (
+        f"{shared_prompt}\n\n"
+        f"(Agent ID: {agent_id}, Model: {model}, Round: {round_num + 1})"
+    )
+
     payload = {
         "model": model,
         "prompt": full_prompt,
-        "stream": False,
+        # Stream tokens so this agent's fragment can enter post-processing
+        # the moment its final token arrives, rather than after the whole
+        # response body is assembled server-side.
+        "stream": True,
         # Ollama raw mode ensures minimal pre-processing/post-processing
-        "raw": True 
+        "raw": True,
+        # Keep the model (and its KV-cache of the shared prompt prefix)
+        # resident between agent calls and across rounds.
+        "keep_alive": "10m"
     }
-    
+
     try:
-        response = requests.post(OLLAMA_URL, json=payload)
-        response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
-        json_response = response.json()
-        code_candidate = json_response.get("response", "").strip()
-        
-        # Add metadata comments to the top of the code for client display
-        final_candidate = (
+        pieces = []
+        async with CLIENT.stream('POST', OLLAMA_URL, json=payload) as response:
+            response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                chunk = orjson.loads(line)
+                pieces.append(chunk.get("response", ""))
+                if chunk.get("done"):
+                    break
+        code_candidate = "".join(pieces).strip()
+
+        # Metadata comments are kept separate from the code so the consensus
+        # grouper can key off the code directly instead of stripping the
+        # header back out; the header is re-attached only for client display.
+        header = (
             f"// Agent: {agent_id} | Model: {model} | Round: {round_num + 1}\n"
-            f"// Seed: {origin[:12]}\n"
-            f"{code_candidate}"
+            f"// Seed: {origin.hex()[:12]}"
         )
-        return {"candidate": final_candidate, "model": model, "success": True}
-        
-    except requests.exceptions.RequestException as e:
+        return {"code": code_candidate, "header": header, "model": model, "success": True}
+
+    except httpx.HTTPError as e:
         error_msg = f"Ollama connection error for agent {agent_id}: {e}"
         print(error_msg)
-        return {"candidate": f"// Agent {agent_id} failed to generate a response.\n// Error: {error_msg}", "model": model, "success": False}
+        header = f"// Agent {agent_id} failed to generate a response.\n// Error: {error_msg}"
+        return {"code": "", "header": header, "model": model, "success": False}
+
+async def run_model_batch(model, batch, shared_prompt, round_num, results_q):
+    """
+    Runs all agents assigned to one model for this round, back-to-back.
+
+    Ollama's /api/generate takes a single prompt, so agents sharing a model
+    are issued sequentially on one task; consecutive same-model requests
+    keep the model loaded and hit the prompt cache on the shared prefix.
+    Each result is pushed onto the queue as soon as that agent's stream
+    finishes, so scoring overlaps with the remaining agents' generation.
+    """
+    for agent in batch:
+        try:
+            result = await perform_fractal_reasoning(agent['id'], model, shared_prompt, round_num, agent['origin'])
+        except Exception as e:
+            # Never leave the consumer waiting on a crashed task.
+            header = f"// Agent {agent['id']} failed to generate a response.\n// Error: {e}"
+            result = {"code": "", "header": header, "model": model, "success": False}
+        await results_q.put((agent, model, result))
+
+# Strips whole-line // comments in one pass over the candidate, instead of
+# split/strip/join making several passes per fragment.
+_COMMENT_RE = re.compile(r'(?m)^\s*//[^\n]*\n?')
+
+@lru_cache(maxsize=256)
+def _normalize(candidate):
+    """Normalizes a candidate (comments removed, trimmed) for grouping.
+
+    Memoized: when agents converge on identical candidates (the point of
+    consensus), the duplicates cost a cache hit instead of a regex pass.
+    The bounded cache keeps memory flat across requests.
+    """
+    return _COMMENT_RE.sub('', candidate).strip()
 
 def assemble_final_answer(all_fragments, genesis_hash):
     """
@@ -107,65 +252,82 @@ def assemble_final_answer(all_fragments, genesis_hash):
     """
     candidate_groups = {}
     for fragment in all_fragments:
-        # Normalize code (remove comments/whitespace) for grouping
-        key = fragment['candidate'].split('\n')
-        key = "\n".join([line for line in key if not line.strip().startswith('//')]).replace('\s', '').strip()
-        
-        if not key: continue
+        # The metadata header never touches the code, so only comments the
+        # model itself emitted are left for _normalize to strip.
+        norm = _normalize(fragment['code'])
+
+        if not norm: continue
+
+        # Group under a fixed-size digest of the normalized code: dict hashing
+        # stays O(1) in candidate length and only one copy of the normalized
+        # string is retained per group.
+        key = hashlib.blake2b(norm.encode('utf-8'), digest_size=16).digest()
 
         if key not in candidate_groups:
             candidate_groups[key] = {
-                'candidates': [], 
-                'totalEntropy': 0, 
-                'agents': set(), 
-                'rounds': set(),
+                'normalized': norm,
+                # Only the count, entropy sum, and two representatives are
+                # needed downstream, so don't retain every fragment per group.
+                'count': 0,
+                'first_candidate': fragment,
+                'totalEntropy': 0,
+                # Agent/round coverage as bitmasks: indices are small ints,
+                # so a single OR replaces a set insert and popcount replaces len().
+                'agent_mask': 0,
+                'round_mask': 0,
                 'root_candidate': None # Store candidate with highest individual entropy
             }
-        
+
         group = candidate_groups[key]
-        group['candidates'].append(fragment)
+        group['count'] += 1
         group['totalEntropy'] += fragment['entropy']
-        group['agents'].add(fragment['agentId'])
-        group['rounds'].add(fragment['round'])
+        group['agent_mask'] |= 1 << fragment['agentIndex']
+        group['round_mask'] |= 1 << fragment['round']
 
         # Track the candidate with the highest entropy for tie-breaking/root selection
         if group['root_candidate'] is None or fragment['entropy'] > group['root_candidate']['entropy']:
              group['root_candidate'] = fragment
 
 
-    scored_groups = []
-    for key, group in candidate_groups.items():
-        if not group['candidates']: continue
-        
-        agent_count = len(group['agents'])
-        round_count = len(group['rounds'])
-        avg_entropy = group['totalEntropy'] / len(group['candidates'])
-        
+    def score_group(key, group):
+        agent_count = group['agent_mask'].bit_count()
+        round_count = group['round_mask'].bit_count()
+        avg_entropy = group['totalEntropy'] / group['count']
+
         # Scoring Formula: Prioritize coverage (agents/rounds) and cryptographic uniqueness (entropy)
-        score = (agent_count * 2) + (round_count * 1.5) + (avg_entropy * 3) 
-        
-        scored_groups.append({
-            'key': key,
+        score = (agent_count * 2) + (round_count * 1.5) + (avg_entropy * 3)
+
+        return {
+            'key': key.hex(),
             'score': round(score, 3),
             'agentCount': agent_count,
             'roundCount': round_count,
             'avgEntropy': round(avg_entropy, 3),
             'rootAgent': group['root_candidate']['agentId'],
             'rootEntropy': group['root_candidate']['entropy'],
-            'candidate': group['candidates'][0]['candidate']
-        })
+            # Re-attach the metadata header only for the displayed candidate.
+            'candidate': f"{group['first_candidate']['header']}\n{group['first_candidate']['code']}"
+        }
 
-    if not scored_groups:
+    if not candidate_groups:
         return {
-            'genesis': genesis_hash, 
-            'selectedCandidate': "// No valid code candidates were generated by the agents.", 
-            'score': 0, 
+            'genesis': genesis_hash,
+            'selectedCandidate': "// No valid code candidates were generated by the agents.",
+            'score': 0,
             'allGroups': []
         }
 
-    scored_groups.sort(key=lambda x: x['score'], reverse=True)
+    if len(candidate_groups) == 1:
+        # Fractal convergence: every agent produced the same candidate, so
+        # there is nothing to rank — skip building and sorting the score list.
+        key, group = next(iter(candidate_groups.items()))
+        scored_groups = [score_group(key, group)]
+    else:
+        scored_groups = [score_group(key, group) for key, group in candidate_groups.items()]
+        scored_groups.sort(key=lambda x: x['score'], reverse=True)
+
     top_group = scored_groups[0]
-    
+
     return {
         'genesis': genesis_hash, 
         'selectedCandidate': top_group['candidate'], 
@@ -178,16 +340,20 @@ def assemble_final_answer(all_fragments, genesis_hash):
         'allGroups': scored_groups
     }
 
-# --- FLASK API ENDPOINT ---
+# --- QUART API ENDPOINT ---
+
+def json_response(payload, status=200):
+    """Serializes an API response with orjson (bytes out, no re-encode)."""
+    return app.response_class(orjson.dumps(payload), status=status, mimetype='application/json')
 
 @app.route('/api/orchestrate', methods=['POST'])
-def orchestrate():
+async def orchestrate():
     """
     Main endpoint to receive client request, run the multi-agent system, and return results.
     """
     try:
-        data = request.json
-        
+        data = await request.get_json()
+
         # Required inputs from the client
         editor_context = data.get('codeContext', '')
         prompt_text = data.get('prompt', 'Optimize this code')
@@ -196,8 +362,13 @@ def orchestrate():
         reasoning_depth = data.get('reasoningDepth', 3)
         file_type = data.get('fileType', 'javascript')
 
-        genesis_hash = sha256(f"GENESIS{time.time()}{editor_context}")
-        
+        genesis_digest = sha256_raw(f"GENESIS{time.time()}{editor_context}")
+        genesis_hash = genesis_digest.hex()
+        shared_prompt = build_shared_prompt(prompt_text, editor_context, file_type, reasoning_depth)
+        # Per-request model rotation: no module-global state on the hot path,
+        # and assignment is deterministic for a given request.
+        model_cycle = itertools.cycle(OLLAMA_MODELS)
+
         fragments = []
         log_entries = []
         
@@ -208,43 +379,63 @@ def orchestrate():
         agents = []
         for i in range(agent_count):
             agent_id = f'agent-{i}'
-            origin_hash = sha256(f"{genesis_hash}{agent_id}{random.random()}")
-            agents.append({'id': agent_id, 'origin': origin_hash})
+            origin_digest = fast_hash_raw(genesis_digest + f"{agent_id}{random.random()}".encode('utf-8'))
+            agents.append({'id': agent_id, 'index': i, 'origin': origin_digest})
         
         # Orchestration Rounds
         for round_num in range(max_rounds):
             log_entries.append({"agent": "relay", "message": f"Starting Round {round_num + 1}/{max_rounds}...", "type": "info"})
             
             round_fragments = []
-            
+
+            # Bucket agents by their assigned model, then dispatch one
+            # concurrent batch per model; round latency is bounded by the
+            # slowest model batch instead of the sum of all agents.
+            by_model = defaultdict(list)
             for agent in agents:
-                model = get_next_model()
-                
-                # Perform the LLM call
-                result = perform_fractal_reasoning(
-                    agent['id'], model, prompt_text, editor_context, round_num, 
-                    agent['origin'], file_type, reasoning_depth
-                )
-                
-                new_origin = sha256(f"{agent['origin']}{genesis_hash}{round_num}")
+                by_model[next(model_cycle)].append(agent)
+
+            results_q = asyncio.Queue()
+            batch_tasks = [
+                asyncio.ensure_future(run_model_batch(model, batch, shared_prompt, round_num, results_q))
+                for model, batch in by_model.items()
+            ]
+
+            # Consume results in completion order: origin-chain bookkeeping
+            # for finished agents overlaps with the agents still generating.
+            round_results = []
+            for _ in range(len(agents)):
+                agent, model, result = await results_q.get()
+                new_origin = fast_hash_raw(agent['origin'] + genesis_digest + round_num.to_bytes(4, 'little'))
                 agent['origin'] = new_origin
-                
+                round_results.append((agent, model, result, new_origin))
+
+            # All results are consumed, so the batch tasks are finished;
+            # gather keeps the round barrier explicit.
+            await asyncio.gather(*batch_tasks)
+
+            # Score the round's origin digests in one vectorized pass.
+            entropies = entropy_batch([origin for _, _, _, origin in round_results])
+
+            for (agent, model, result, new_origin), entropy in zip(round_results, entropies):
                 # Store the fragment data
                 fragment = {
                     'agentId': agent['id'],
-                    'origin': agent['origin'],
+                    'agentIndex': agent['index'],
+                    'origin': new_origin,
                     'round': round_num,
-                    'candidate': result['candidate'],
-                    'entropy': calculate_entropy(new_origin),
+                    'code': result['code'],
+                    'header': result['header'],
+                    'entropy': entropy,
                     'model': model
                 }
-                
+
                 fragments.append(fragment)
                 round_fragments.append(fragment)
-                
+
                 log_entries.append({
-                    "agent": "sentinel", 
-                    "message": f"Fragment from {agent['id']} (Model: {model}) - Entropy: {fragment['entropy']}", 
+                    "agent": "sentinel",
+                    "message": f"Fragment from {agent['id']} (Model: {model}) - Entropy: {fragment['entropy']}",
                     "type": "fragment"
                 })
 
@@ -253,25 +444,26 @@ def orchestrate():
         consensus = assemble_final_answer(fragments, genesis_hash)
         
         # Return the final result and all logs for the client to display
-        return jsonify({
+        return json_response({
             "status": "success",
             "log": log_entries,
             "consensus": consensus
         })
-        
+
     except Exception as e:
         print(f"Server Orchestration Error: {e}")
-        return jsonify({
+        return json_response({
             "status": "error",
             "message": str(e),
             "log": [{"agent": "nexus", "message": f"Critical Server Error: {e}", "type": "error"}]
-        }), 500
+        }, status=500)
 
 # --- RUN SERVER ---
 
 if __name__ == '__main__':
     print("--- Ollama Multi-Agent Orchestrator ---")
     print("WARNING: Ensure Ollama is running on port 11434 before starting.")
-    print("Starting Flask server on http://127.0.0.1:5000")
-    # Use threaded=True for concurrent requests from the client
-    app.run(host='127.0.0.1', port=5000, debug=True, threaded=True)
+    print("Starting uvicorn server on http://127.0.0.1:5000")
+    # Production ASGI server: no debug reloader or per-request stat() calls;
+    # the event loop handles concurrent requests natively.
+    uvicorn.run(app, host='127.0.0.1', port=5000)